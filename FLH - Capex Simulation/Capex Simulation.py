@@ -42,20 +42,30 @@ def main_app():
     # It has been moved outside the main_app() function to the bottom of the script.
 
     # --- Helper Functions ---
-    @st.cache_data
-    def convert_df_to_csv(df):
-        """Converts a DataFrame to a UTF-8 encoded CSV file for downloading."""
-        return df.to_csv(index=False).encode('utf-8')
-
-    def dfs_to_excel_bytes(df_dict):
+    @st.cache_data(hash_funcs={pd.DataFrame: lambda df: (
+        df.shape, tuple(df.columns), tuple(map(str, df.dtypes)), pd.util.hash_pandas_object(df, index=False).values.tobytes()
+    )})
+    def dfs_to_excel_bytes(summary_params, df_dict):
         """
         Converts a dictionary of DataFrames to an in-memory Excel file byte stream.
-        Each DataFrame becomes a sheet in the Excel file.
+        `summary_params` is a tuple of (parameter, value, format) rows written first as the
+        "Summary_Parameters" sheet; each DataFrame then becomes a sheet in the Excel file.
         """
         output = BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
+        # constant_memory streams each row out as soon as the next one starts, which needs strictly
+        # row-ordered writes; df.to_excel writes column by column, so rows are written directly.
+        with pd.ExcelWriter(output, engine='xlsxwriter', engine_kwargs={'options': {'constant_memory': True, 'use_zip64': True}}) as writer:
+            # Same header style df.to_excel applies
+            header_format = writer.book.add_format({'bold': True, 'border': 1, 'align': 'center', 'valign': 'top'})
+            summary_sheet = writer.book.add_worksheet("Summary_Parameters")
+            summary_sheet.write_row(0, 0, ("Parameter", "Value"), header_format)
+            for row_number, (parameter, value, value_format) in enumerate(summary_params, start=1):
+                summary_sheet.write_row(row_number, 0, (parameter, value_format.format(value)))
             for sheet_name, df in df_dict.items():
-                df.to_excel(writer, sheet_name=sheet_name, index=False)
+                worksheet = writer.book.add_worksheet(sheet_name)
+                worksheet.write_row(0, 0, df.columns, header_format)
+                for row_number, row in enumerate(df.itertuples(index=False), start=1):
+                    worksheet.write_row(row_number, 0, row)
         processed_data = output.getvalue()
         return processed_data
 
@@ -81,69 +91,124 @@ def main_app():
         cost_per_account = st.number_input("Revenue per Account ($)", value=200, step=10)
         payout_per_successful_account = st.number_input("Payout per Successful Account ($)", value=1000, step=50)
         additional_revenue = st.number_input("Additional Revenue / Fixed Costs ($)", value=200000, step=10000)
+        st.header("Reproducibility")
+        seed = st.number_input("Random seed", min_value=0, value=42, step=1)
+
+
+    # --- Random Number Streams ---
+    # Each stage draws from its own PCG64 stream spawned from the user's seed, so stages never
+    # share or overlap random state.
+    ACCOUNTS_STREAM, SCENARIO_STREAM, RISK_STREAM = range(3)
 
+    def seeded_rng(seed, stream):
+        return np.random.Generator(np.random.PCG64(np.random.SeedSequence(seed, spawn_key=(stream,))))
 
     # --- Generate Trader Accounts based on Mode ---
+    # Cache keys are built from small scalars/tuples (never the accounts array itself) and every
+    # RNG is seeded explicitly, so reruns triggered by unrelated widgets hit the cache.
+    @st.cache_data
+    def get_trader_accounts(distribution_mode, num_traders, account_params, seed):
+        rng = seeded_rng(seed, ACCOUNTS_STREAM)
+        if distribution_mode == "Simulate Average":
+            (avg_accounts,) = account_params
+            return rng.poisson(avg_accounts, num_traders).astype(np.int32)
+        else: # Randomized mode
+            low, high = account_params
+            return rng.integers(low=low, high=high + 1, size=num_traders, dtype=np.int32)
+
+    @st.cache_data
+    def get_total_accounts(distribution_mode, num_traders, account_params, seed):
+        return int(np.sum(get_trader_accounts(distribution_mode, num_traders, account_params, seed), dtype=np.int64))
+
     if distribution_mode == "Simulate Average":
-        trader_accounts = np.random.poisson(avg_accounts_per_trader, num_traders)
+        account_params = (avg_accounts_per_trader,)
     else: # Randomized mode
-        trader_accounts = np.random.randint(
-            low=randomized_account_range[0],
-            high=randomized_account_range[1] + 1,
-            size=num_traders
-        )
-    total_accounts = np.sum(trader_accounts)
+        account_params = tuple(randomized_account_range)
+    total_accounts = get_total_accounts(distribution_mode, num_traders, account_params, seed)
 
     # --- Core Simulation & Charting Logic (Functions) ---
     @st.cache_data
-    def run_vectorized_simulation(trader_accounts, n_simulations, failure_rates, payout_per_successful_account):
-        results = {}
-        for rate in failure_rates:
-            success_rate = 1 - rate
-            successful_accounts_matrix = np.random.binomial(
-                n=trader_accounts, p=success_rate, size=(n_simulations, len(trader_accounts))
-            )
-            total_successful_accounts_per_sim = np.sum(successful_accounts_matrix, axis=1)
-            payouts_for_rate = total_successful_accounts_per_sim * payout_per_successful_account
-            results[rate] = payouts_for_rate
-        return results
-
-    def create_dist_chart(df: pd.DataFrame, title: str) -> alt.Chart:
+    def run_vectorized_simulation(num_traders, n_simulations, failure_rates, payout_per_successful_account, seed, distribution_mode, account_params):
+        # A sum of independent Binomial(n_i, p) draws is exactly Binomial(sum(n_i), p), so the
+        # per-sim totals are drawn directly without materializing a per-trader matrix.
+        rng = seeded_rng(seed, SCENARIO_STREAM)
+        success_rates = 1 - np.asarray(failure_rates, dtype=np.float64)
+        total_accounts_for_run = get_total_accounts(distribution_mode, num_traders, account_params, seed)
+        total_successful_accounts_per_sim = rng.binomial(
+            n=total_accounts_for_run,
+            p=success_rates[:, None],
+            size=(len(success_rates), n_simulations)
+        )
+        # (rates, simulations) payout matrix; row i corresponds to failure_rates[i]
+        return total_successful_accounts_per_sim * payout_per_successful_account
+
+    def analytic_moments(total_accounts, failure_rate, payout_per_successful_account):
+        """
+        Exact mean and standard deviation of the total payout. Successful accounts across all
+        traders follow Binomial(total_accounts, 1 - failure_rate), so no sampling is needed.
+        """
+        success_rate = 1 - failure_rate
+        mean_payout = payout_per_successful_account * total_accounts * success_rate
+        std_payout = abs(payout_per_successful_account) * np.sqrt(total_accounts * success_rate * failure_rate)
+        return mean_payout, std_payout
+
+    def create_dist_chart(payouts: np.ndarray, payout_per_successful_account, title: str) -> alt.Chart:
+        # Bin server-side so the browser receives at most 50 rows instead of one row per simulation.
+        # Payouts are whole multiples of the per-account payout, so bins are built over success
+        # counts with an integer width; every bin then covers the same number of possible outcomes.
+        payout_step = payout_per_successful_account or 1
+        successes = payouts // payout_step
+        lowest = successes.min()
+        bin_width = max(1, int(np.ceil((successes.max() - lowest + 1) / 50)))
+        counts = np.bincount((successes - lowest) // bin_width)
+        edges = (lowest + bin_width * np.arange(len(counts) + 1)) * payout_step
+        df = pd.DataFrame({'bin_start': edges[:-1], 'bin_end': edges[1:], 'count': counts})
         chart = alt.Chart(df).mark_bar(opacity=0.7).encode(
-            alt.X('Payouts:Q', bin=alt.Bin(maxbins=50), title="Total Payout Amount"),
-            y=alt.Y('count():Q', title="Frequency of Outcome"),
-            tooltip=[alt.Tooltip('Payouts:Q', bin=True), 'count()']
+            x=alt.X('bin_start:Q', title="Total Payout Amount"),
+            x2='bin_end:Q',
+            y=alt.Y('count:Q', title="Frequency of Outcome"),
+            tooltip=[alt.Tooltip('bin_start:Q', title="From"), alt.Tooltip('bin_end:Q', title="To"), alt.Tooltip('count:Q', title="Count")]
         ).properties(title=alt.TitleParams(text=title, anchor='middle'))
         return chart
 
+    def cohort_payout_std_devs(cohort_accounts, n_simulations, failure_rates, payout_per_successful_account, rng):
+        """
+        Standard deviation of payouts for every (cohort, failure rate) pair in one fused draw.
+        `cohort_accounts` has one row of trader accounts per cohort; returns a (cohorts, rates) matrix.
+        """
+        success_rates = 1 - np.asarray(failure_rates, dtype=np.float64)
+        cohort_totals = cohort_accounts.sum(axis=1, dtype=np.int64)
+        total_successful_accounts = rng.binomial(
+            n=cohort_totals[:, None, None],
+            p=success_rates[None, :, None],
+            size=(len(cohort_totals), len(success_rates), n_simulations)
+        )
+        return total_successful_accounts.std(axis=2) * abs(payout_per_successful_account)
+
+    def std_devs_to_frame(std_devs, cohort_values, cohort_column, failure_rates):
+        """Flattens a (cohorts, rates) std-dev matrix into one row per (cohort, rate) pair, cohort-major."""
+        n_cohorts, n_rates = std_devs.shape
+        return pd.DataFrame({
+            cohort_column: np.repeat(np.asarray(cohort_values, dtype=np.int32), n_rates),
+            'Failure Rate': [f"{int(rate * 100)}%" for rate in failure_rates] * n_cohorts,
+            'Standard Deviation': np.asarray(std_devs, dtype=np.float64).ravel()
+        }, copy=False)
+
     @st.cache_data
-    def run_risk_analysis(num_traders, n_simulations, failure_rates, payout_per_successful_account):
-        std_devs_data = []
-        avg_accounts_range = range(1, 21)
-        for avg_acc in avg_accounts_range:
-            trader_accounts_for_run = np.random.poisson(avg_acc, num_traders)
-            sim_res = run_vectorized_simulation(trader_accounts_for_run, n_simulations, failure_rates, payout_per_successful_account)
-            for rate, payouts in sim_res.items():
-                std_devs_data.append({
-                    'Average Accounts per Trader': avg_acc,
-                    'Failure Rate': f"{int(rate * 100)}%",
-                    'Standard Deviation': np.std(payouts)
-                })
-        return pd.DataFrame(std_devs_data)
+    def run_risk_analysis(num_traders, n_simulations, failure_rates, payout_per_successful_account, seed):
+        rng = seeded_rng(seed, RISK_STREAM)
+        avg_accounts_range = np.arange(1, 21)
+        cohort_accounts = rng.poisson(avg_accounts_range[:, None], size=(len(avg_accounts_range), num_traders)).astype(np.int32)
+        std_devs = cohort_payout_std_devs(cohort_accounts, n_simulations, failure_rates, payout_per_successful_account, rng)
+        return std_devs_to_frame(std_devs, avg_accounts_range, 'Average Accounts per Trader', failure_rates)
 
     @st.cache_data
-    def run_randomized_risk_analysis(num_traders, n_simulations, failure_rates, payout_per_successful_account):
-        risk_data = []
-        for max_range_val in range(2, 21):
-            trader_accounts_for_run = np.random.randint(low=1, high=max_range_val + 1, size=num_traders)
-            sim_res = run_vectorized_simulation(trader_accounts_for_run, n_simulations, failure_rates, payout_per_successful_account)
-            for rate, payouts in sim_res.items():
-                risk_data.append({
-                    'Max Accounts in Range': max_range_val,
-                    'Failure Rate': f"{int(rate * 100)}%",
-                    'Standard Deviation': np.std(payouts)
-                })
-        return pd.DataFrame(risk_data)
+    def run_randomized_risk_analysis(num_traders, n_simulations, failure_rates, payout_per_successful_account, seed):
+        rng = seeded_rng(seed, RISK_STREAM)
+        max_range_values = np.arange(2, 21)
+        cohort_accounts = rng.integers(low=1, high=max_range_values[:, None] + 1, size=(len(max_range_values), num_traders), dtype=np.int32)
+        std_devs = cohort_payout_std_devs(cohort_accounts, n_simulations, failure_rates, payout_per_successful_account, rng)
+        return std_devs_to_frame(std_devs, max_range_values, 'Max Accounts in Range', failure_rates)
 
 
     # --- Main App Display ---
@@ -153,50 +218,69 @@ def main_app():
 
 
     # <<< REFACTOR: Pre-compute all data for the report and tabs >>>
-    st.markdown("---")
-    with st.spinner("Generating all simulation data for the report..."):
+    scenario_failure_rates = (0.90, 0.85, 0.80, 0.75, 0.50)
+
+    def compute_all():
         # 1. Data for Scenario Analysis
-        scenario_failure_rates = [0.90, 0.85, 0.80, 0.75, 0.50]
-        simulation_results = run_vectorized_simulation(trader_accounts, n_simulations, scenario_failure_rates, payout_per_successful_account)
+        scenario_payouts_matrix = run_vectorized_simulation(num_traders, n_simulations, scenario_failure_rates, payout_per_successful_account, seed, distribution_mode, account_params)
         
-        all_scenarios_data = []
-        for rate, payouts in simulation_results.items():
-            for payout_value in payouts:
-                all_scenarios_data.append({
-                    'failure_rate_scenario': f"{int(rate * 100)}%",
-                    'simulated_payout': payout_value,
-                    'associated_profit': total_revenue - payout_value
-                })
-        df_all_scenarios = pd.DataFrame(all_scenarios_data)
+        scenario_payouts = scenario_payouts_matrix.ravel()
+        df_all_scenarios = pd.DataFrame({
+            'failure_rate_scenario': pd.Categorical.from_codes(
+                np.repeat(np.arange(len(scenario_failure_rates), dtype=np.int8), n_simulations),
+                categories=[f"{int(rate * 100)}%" for rate in scenario_failure_rates]
+            ),
+            'simulated_payout': scenario_payouts,
+            'associated_profit': total_revenue - scenario_payouts
+        })
 
         # 2. Data for Breakeven Analysis
-        failure_rate_range = np.arange(0.01, 1.00, 0.01)
-        breakeven_results = run_vectorized_simulation(trader_accounts, n_simulations, failure_rate_range, payout_per_successful_account)
-        profit_data = [{'failure_rate': rate, 'estimated_profit': total_revenue - np.mean(payouts)} for rate, payouts in breakeven_results.items()]
-        df_profit = pd.DataFrame(profit_data).sort_values('failure_rate')
+        # Only the expected payout is needed here, and E[payout] = payout * total_accounts * (1 - rate)
+        # exactly, so no Monte Carlo sweep is run for this curve.
+        failure_rate_range = np.round(np.arange(0.01, 1.00, 0.01), 2)
+        mean_payouts = payout_per_successful_account * total_accounts * (1.0 - failure_rate_range)
+        df_profit = pd.DataFrame({'failure_rate': failure_rate_range, 'estimated_profit': total_revenue - mean_payouts})
 
         # 3. Data for Risk Analysis
         if distribution_mode == 'Simulate Average':
-            df_risk_analysis = run_risk_analysis(num_traders, n_simulations, scenario_failure_rates, payout_per_successful_account)
+            df_risk_analysis = run_risk_analysis(num_traders, n_simulations, scenario_failure_rates, payout_per_successful_account, seed)
         else:
-            df_risk_analysis = run_randomized_risk_analysis(num_traders, n_simulations, scenario_failure_rates, payout_per_successful_account)
+            df_risk_analysis = run_randomized_risk_analysis(num_traders, n_simulations, scenario_failure_rates, payout_per_successful_account, seed)
 
-        # 4. Summary data
-        summary_params = {
-            "Parameter": ["Distribution Mode", "Number of Traders", "Simulations per Scenario", "Revenue per Account", "Payout per Success", "Additional Revenue/Fixed Costs", "Total Calculated Revenue"],
-            "Value": [distribution_mode, f"{num_traders:,}", f"{n_simulations:,}", f"${cost_per_account:,.2f}", f"${payout_per_successful_account:,.2f}", f"${additional_revenue:,.2f}", f"${total_revenue:,.2f}"]
+        return {
+            "scenario_payouts_matrix": scenario_payouts_matrix,
+            "df_all_scenarios": df_all_scenarios,
+            "df_profit": df_profit,
+            "df_risk_analysis": df_risk_analysis
         }
-        df_summary = pd.DataFrame(summary_params)
+
+    # Only recompute when a simulation-relevant input changes; pure display reruns reuse the bundle.
+    sim_key = (distribution_mode, num_traders, account_params, n_simulations, cost_per_account, payout_per_successful_account, additional_revenue, seed)
+    st.markdown("---")
+    if st.session_state.get("sim_key") != sim_key:
+        with st.spinner("Generating all simulation data for the report..."):
+            st.session_state["sim_bundle"] = compute_all()
+        st.session_state["sim_key"] = sim_key
+    sim_bundle = st.session_state["sim_bundle"]
 
 
     # <<< NEW: Prepare and offer the main Excel download button >>>
+    # Summary values are formatted inside dfs_to_excel_bytes, only when the report is (re)built
+    summary_params = (
+        ("Distribution Mode", distribution_mode, "{}"),
+        ("Number of Traders", num_traders, "{:,}"),
+        ("Simulations per Scenario", n_simulations, "{:,}"),
+        ("Revenue per Account", cost_per_account, "${:,.2f}"),
+        ("Payout per Success", payout_per_successful_account, "${:,.2f}"),
+        ("Additional Revenue/Fixed Costs", additional_revenue, "${:,.2f}"),
+        ("Total Calculated Revenue", total_revenue, "${:,.2f}")
+    )
     report_data_dict = {
-        "Summary_Parameters": df_summary,
-        "Scenario_Analysis_Raw": df_all_scenarios,
-        "Breakeven_Analysis": df_profit,
-        "Risk_Analysis": df_risk_analysis
+        "Scenario_Analysis_Raw": sim_bundle["df_all_scenarios"],
+        "Breakeven_Analysis": sim_bundle["df_profit"],
+        "Risk_Analysis": sim_bundle["df_risk_analysis"]
     }
-    excel_bytes = dfs_to_excel_bytes(report_data_dict)
+    excel_bytes = dfs_to_excel_bytes(summary_params, report_data_dict)
 
     st.download_button(
         label="📥 Download Full Report as Excel",
@@ -208,14 +292,15 @@ def main_app():
 
 
     # --- Display Data in Tabs (No More Calculations Here) ---
+    scenario_payouts_matrix = sim_bundle["scenario_payouts_matrix"]
+    df_profit = sim_bundle["df_profit"]
+    df_risk_analysis = sim_bundle["df_risk_analysis"]
     tab1, tab2, tab3 = st.tabs(["Scenario Analysis", "Breakeven Analysis", "Risk Analysis"])
 
     with tab1:
         st.header("Payout & Profitability Scenarios")
-        for rate in scenario_failure_rates:
-            payouts = simulation_results[rate]
-            mean_payout = np.mean(payouts)
-            std_payout = np.std(payouts)
+        for rate, payouts in zip(scenario_failure_rates, scenario_payouts_matrix):
+            mean_payout, std_payout = analytic_moments(total_accounts, rate, payout_per_successful_account)
             
             st.subheader(f"Scenario: {int(rate * 100)}% Failure Rate")
             col1, col2, col3 = st.columns(3)
@@ -230,16 +315,17 @@ def main_app():
                 col2.write("68% Confidence Profit Range:")
                 col2.write(f"`${profit_minus_1_std:,.2f}` to `${profit_plus_1_std:,.2f}`")
             with col3:
-                df_chart = pd.DataFrame({'Payouts': payouts})
-                chart = create_dist_chart(df_chart, "Distribution of Potential Payouts")
+                chart = create_dist_chart(payouts, payout_per_successful_account, "Distribution of Potential Payouts")
                 col3.altair_chart(chart, use_container_width=True)
 
     with tab2:
         st.header("Find Lowest Profitable Failure Rate")
-        df_profitable = df_profit[df_profit['estimated_profit'] > 0]
-        if not df_profitable.empty:
-            lowest_profitable_rate = df_profitable['failure_rate'].min()
-            highest_profit_at_lowest_rate = df_profitable.loc[df_profitable['failure_rate'] == lowest_profitable_rate, 'estimated_profit'].iloc[0]
+        # df_profit is in ascending failure-rate order, so the first profitable row is the lowest rate
+        profitable_mask = df_profit['estimated_profit'].to_numpy() > 0
+        if profitable_mask.any():
+            lowest_profitable_idx = profitable_mask.argmax()
+            lowest_profitable_rate = df_profit['failure_rate'].iat[lowest_profitable_idx]
+            highest_profit_at_lowest_rate = df_profit['estimated_profit'].iat[lowest_profitable_idx]
             st.success(f"The lowest failure rate with a positive estimated profit is **{lowest_profitable_rate * 100:.2f}%**.")
             profit_chart = alt.Chart(df_profit).mark_area(
                 line={'color':'darkgreen'},